@@ -1,24 +1,110 @@
 #!/usr/bin/env python3
 
-from collections import namedtuple, UserList
+from abc import ABCMeta
+from collections import namedtuple
+from itertools import islice
 from pathlib import Path
-
-class Blob:
-    """A blob of binary data or information
-
-    Fields:
-
-    sig: The four-character ASCII type identifier
-
-    content: The payload. May or may not be converted to a native Python type,
-    depending on if `dtype` is specified, or `convert` has been called. If not,
-    is a `bytes` objext.
-
-    contentRaw: The `bytes` object representing the data as written on disk.
-
-    size: The size of the data, as wrtten to disk, in bytes
+import mmap
+import os
+import struct
+import sys
+
+# Blob header: 4 byte ASCII signature and 4 byte size
+_HDR = struct.Struct( '>4sI' )
+# Header of a standard group: a blob header plus 4 byte element count
+_GRPHDR = struct.Struct( '>4sIi' )
+
+# Decoders for integers of the common sizes
+_INTS = { n: struct.Struct( '>' + c ).unpack
+         for n, c in ( (1, 'b'), (2, 'h'), (4, 'i'), (8, 'q') ) }
+
+# Payloads up to this size are kept in a Blob's cached encoding; larger ones,
+# and those viewing a memory-mapped file, would cost a second copy of the data
+_CACHE_LIMIT = 256
+
+def _sigBytes( sig ):
+    """Return a signature as written to disk. `struct` would silently truncate
+    or pad it to fit, so a ValueError is raised if it isn't exactly 4 bytes."""
+
+    raw = sig.encode( 'ASCII' )
+    if len( raw ) != 4:
+        raise ValueError( f'Signature must be 4 characters: {sig!r}' )
+    return raw
+
+# Marks content that hasn't yet been converted from the raw data
+_UNSET = object()
+
+# Converters from a Blob's content to its raw form. Each takes the content and
+# requested size, and returns the raw `bytes` and actual size.
+
+def _fromBytes( content, size ):
+    if size is None: size = len( content )
+    return content, size
+
+def _fromView( content, size ):
+    # len() counts items, not bytes, unless the view is of single bytes
+    if content.format != 'B':
+        content = content.cast( 'B' )
+    if size is None: size = len( content )
+    return content, size
+
+def _fromBuffer( content, size ):
+    # Any other bytes-like object, such as a `bytearray` or `array`
+    if size is None: size = memoryview( content ).nbytes
+    return content, size
+
+def _fromInt( content, size ):
+    if size is None: size = 4
+    return content.to_bytes( size, byteorder='big', signed=True ), size
+
+def _fromBool( content, size ):
+    if size is None: size = 1
+    return content.to_bytes( size, byteorder='big', signed=True ), size
+
+def _fromStr( content, size ):
+    raw = content.encode()
+    if size is None: size = len( raw )
+    return raw, size
+
+def _fromNone( content, size ):
+    return None, 0
+
+# Dispatched on exact type, so `bool` isn't caught by `int`. Other types go
+# through _converterFor().
+_CTOR = {
+    bytes: _fromBytes,
+    memoryview: _fromView,
+    int: _fromInt,
+    bool: _fromBool,
+    str: _fromStr,
+    type( None ): _fromNone,
+}
+
+def _converterFor( content ):
+    """Return the converter for content whose type isn't in _CTOR, such as a
+    subclass of one that is. Anything else is treated as raw binary data."""
+
+    # `bool` first, as it's a subclass of `int`
+    if isinstance( content, bool ):
+        return _fromBool
+    if isinstance( content, int ):
+        return _fromInt
+    if isinstance( content, str ):
+        return _fromStr
+    if isinstance( content, memoryview ):
+        return _fromView
+    return _fromBuffer
+
+class _BlobBase( metaclass=ABCMeta ):
+    """Behavior shared by Blob and BlobGroup.
+
+    This holds no fields of its own; subclasses provide the slots for them. It
+    exists because `list` can't be combined with a base that has slots.
+    BlobGroup is registered as a virtual subclass of Blob, so `isinstance`
+    checks against Blob still accept groups.
     """
 
+    __slots__ = ()
 
     def __init__( self, sig, content=None, size=None, dtype=None ):
         """Create a new Blob.
@@ -39,53 +125,98 @@ class Blob:
         content should be converted to.
         """
 
-        self.sig = sig
-        self.content = content
-
-        if isinstance( content, bytes ):
-            self.contentRaw = content
-        elif isinstance( content, int ):
-            if size == None: size = 4
-            self.contentRaw = content.to_bytes(
-                    size, byteorder='big', signed=True )
-        elif isinstance( content, bool ):
-            if size == None: size = 1
-            self.contentRaw = int( content ).to_bytes(
-                    size, byteorder='big', signed=True )
-        elif isinstance( content, str ):
-            self.contentRaw = content.encode()
-        elif content is None:
-            size = 0
-            self.contentRaw = None
-
-        if size == None: size = len( self.contentRaw )
-
-        self.size = size
+        self._sig = sig
+        self._dtype = dtype
         if dtype:
-            self.convert( dtype )
+            self._content = _UNSET
+        else:
+            self._content = content
+        self._encoded = None
+
+        if type( content ) is bytes:
+            # Raw data, as read from a file
+            self._contentRaw = content
+            self._size = len( content ) if size is None else size
+        else:
+            handler = _CTOR.get( type( content ))
+            if handler is None:
+                handler = _converterFor( content )
+            self._contentRaw, self._size = handler( content, size )
+
+    # Changing any of these invalidates the cached encoding
+
+    @property
+    def sig( self ):
+        return self._sig
+
+    @sig.setter
+    def sig( self, sig ):
+        self._sig = sig
+        self._encoded = None
+
+    @property
+    def contentRaw( self ):
+        return self._contentRaw
+
+    @contentRaw.setter
+    def contentRaw( self, contentRaw ):
+        self._contentRaw = contentRaw
+        self._encoded = None
+
+    @property
+    def size( self ):
+        return self._size
+
+    @size.setter
+    def size( self, size ):
+        self._size = size
+        self._encoded = None
+
+    @property
+    def content( self ):
+        """The payload (see class documentation)"""
+        if self._content is _UNSET:
+            self._content = self.getAs( self._dtype )
+        return self._content
+
+    @content.setter
+    def content( self, content ):
+        self._content = content
 
     def getAs( self, dtype ):
-        """Return the payload as the given type"""
+        """Return the payload as the given type
+
+        Integers are decoded as signed, matching how they're written. The
+        format allows either signed or unsigned integers, so for data from an
+        unsigned writer, values of 2**31 and above (for a 4 byte integer) will
+        come back negative; use `int.from_bytes( blob.contentRaw, 'big' )` for
+        those instead.
+        """
 
         if dtype is int:
-            return int.from_bytes( self.contentRaw, byteorder='big' )
+            raw = self._contentRaw
+            unpack = _INTS.get( len( raw ))
+            if unpack:
+                return unpack( raw )[0]
+            return int.from_bytes( raw, byteorder='big', signed=True )
         if dtype is str:
             try:
-                return self.contentRaw.decode()
+                return str( self._contentRaw, 'utf-8' )
             except:
-                return str( self.contentRaw )
+                return str( bytes( self._contentRaw ))
         if dtype is bytes:
-            return self.contentRaw
+            return self._contentRaw
         if dtype is bool:
             return bool( self.getAs( int ))
         if dtype is None:
             return None
-        return self.contentRaw
+        return self._contentRaw
 
     def convert( self, dtype ):
         """Convert our data field to the given type"""
-        self.content = self.getAs( dtype )
-        return self.content
+        self._dtype = dtype
+        self._content = self.getAs( dtype )
+        return self._content
 
     def __str__( self ):
         """Return the content as a string.
@@ -94,14 +225,14 @@ class Blob:
         returns the content converted to a `str`
         """
 
-        if isinstance( self.content, bytes ):
+        if isinstance( self.content, (bytes, memoryview) ):
             return "<DATA>"
         return str( self.content )
 
     def __repr__( self ):
         """Return the content in Python representation"""
 
-        if isinstance( self.content, bytes ):
+        if isinstance( self.content, (bytes, memoryview) ):
             return "bytes(...)"
         return repr( self.content )
 
@@ -114,28 +245,110 @@ class Blob:
 
     def __bool__( self ):
         """Return the content converted to a bool"""
-        return bool( int( self ))
+        return self._contentRaw is not None and any( self._contentRaw )
 
     def __bytes__( self ):
         """Return the ray binary content"""
-        return self.contentRaw
+        return bytes( self._contentRaw )
+
+    def encodedSize( self ):
+        """Return the size of the blob as encoded, including its header"""
+        return _HDR.size + self._size
+
+    def encodeInto( self, buf, off ):
+        """Encode blob into `buf` at offset `off`.
+
+        `buf` is a writable buffer, such as a `bytearray` or a `memoryview` of
+        one, and must already have room for encodedSize() bytes at `off`; if
+        it hasn't, ValueError is raised and nothing is written. Returns the
+        offset just past the end of the encoded blob."""
+
+        _sigBytes( self._sig )
+        if off < 0 or off + self.encodedSize() > len( buf ):
+            raise ValueError( f'Buffer of {len( buf )} bytes has no room '
+                    f'for {self.encodedSize()} bytes at offset {off}' )
+        return self._packInto( buf, off )
+
+class Blob( _BlobBase ):
+    """A blob of binary data or information
+
+    Fields:
+
+    sig: The four-character ASCII type identifier
+
+    content: The payload. May or may not be converted to a native Python type,
+    depending on if `dtype` is specified, or `convert` has been called. If not,
+    is a `bytes` objext. A `dtype` conversion is done when `content` is first
+    accessed, rather than when the Blob is created.
+
+    contentRaw: The `bytes` object representing the data as written on disk.
+    For a blob read from a memory-mapped BlobFile, this is a `memoryview` into
+    the file instead.
+
+    size: The size of the data, as wrtten to disk, in bytes
+    """
+
+    __slots__ = ( '_sig', '_content', '_dtype', '_contentRaw', '_size',
+                 '_encoded' )
 
     def encode( self ):
         """Encode blob into format suitable for writing.
 
-        This will create a `bytearray` with the 4 byte ASCII identifier, a 4
-        byte size, and the data itself."""
-        output = bytearray()
-        output.extend( self.sig.encode( 'ASCII' ))
-        output.extend( self.size.to_bytes( 4, byteorder='big' ))
-        if self.size:
-            output.extend( self.contentRaw )
-        return output
+        This returns `bytes` with the 4 byte ASCII identifier, a 4 byte size,
+        and the data itself. For small payloads, the result is cached, and
+        reused until `sig`, `size` or `contentRaw` is assigned to. Changes
+        made to a mutable `contentRaw` in place aren't noticed."""
+
+        encoded = self._encoded
+        if encoded is not None:
+            return encoded
+        parts = []
+        self._encodeParts( parts )
+        if len( parts ) == 1:
+            return parts[0]
+        return b''.join( parts )
+
+    def _encodeParts( self, parts ):
+        """Append the encoded blob to the list `parts`, for joining.
+
+        A payload too large to cache is appended as is, after the header,
+        rather than being copied into an encoding of its own."""
+
+        encoded = self._encoded
+        if encoded is None:
+            # `struct` would silently truncate or pad a bad signature to fit
+            sig = self._sig.encode( 'ASCII' )
+            if len( sig ) != 4:
+                raise ValueError(
+                        f'Signature must be 4 characters: {self._sig!r}' )
+            size = self._size
+            header = _HDR.pack( sig, size )
+            raw = self._contentRaw
+            if not size:
+                encoded = self._encoded = header
+            elif size <= _CACHE_LIMIT and type( raw ) is not memoryview:
+                encoded = self._encoded = header + raw
+            else:
+                parts.append( header )
+                parts.append( raw )
+                return
+        parts.append( encoded )
+
+    def _packInto( self, buf, off ):
+        """Write the encoded blob into `buf` at `off`, which has been checked
+        to have room for it. Returns the offset just past the end."""
+
+        size = self._size
+        _HDR.pack_into( buf, off, _sigBytes( self._sig ), size )
+        off += _HDR.size
+        if size:
+            buf[off:off + size] = self._contentRaw
+        return off + size
 
-class BlobGroup( Blob, UserList ):
+class BlobGroup( _BlobBase, list ):
     """A group of Blobs.
 
-    This is a 'hybrid' of a `list` and a `dict`. It subclasses UserList, so
+    This is a 'hybrid' of a `list` and a `dict`. It subclasses `list`, so
     accessing it as a list works as expeted: It contains all the child blobs.
     It also has several `dict`-like accessors: It can be subscripted with a
     `str`, which returns the first child of the given signature. Subscripting
@@ -146,13 +359,17 @@ class BlobGroup( Blob, UserList ):
     Note that the first time a `dict`-style accessor is called, the group's 'keys'
     are stored in a cache, and not updated again. Consequently, `dict`-style
     accessors should not be used until the group is fully populated, or,
-    alternately, clearDict() should be called after any changed.
+    alternately, clearDict() should be called after any changed. Groups read
+    from a BlobFile have this cache filled in as they're read.
 
     Fields:
 
     sig: The identifier of the opening Blob
 
-    data: A `list` of the children
+    data: The children, as a `list`. This is the group itself, and is kept for
+    compatibility; assigning to it replaces the children. Note that the
+    group holds its own copy of the list of children it was created or
+    assigned with, so later changes to that list aren't seen by the group.
 
     dict: A `dict` mapping the first child with the given signature to the
     child itself.
@@ -165,12 +382,24 @@ class BlobGroup( Blob, UserList ):
     terminator: If a non-standard group is read, this may contain the ending
     marker blob
     """
+
+    __slots__ = Blob.__slots__ + ( 'dict', 'terminator' )
+
     def __init__( self, sig, children=None, content=None ):
+        """Create a new BlobGroup.
+
+        sig: The 4-character type identifier
+
+        children: An iterable of the initial children. These are copied into
+        the group; the group doesn't share the caller's list.
+
+        content: The content of the opening blob (see class documentation)
+        """
+
         super().__init__( sig, content )
 
-        self.data = []
         if children:
-            self.data = children
+            self.extend( children )
         self.dict = {}
         self.terminator = None
         
@@ -186,8 +415,15 @@ class BlobGroup( Blob, UserList ):
         used."""
 
         if not self.dict:
+            lookup = {}
+            setdefault = lookup.setdefault
             for blob in self:
-                self.dict.setdefault( blob.sig, blob )
+                setdefault( blob._sig, blob )
+            self.dict = lookup
+
+    def __bool__( self ):
+        """A group is true if it has any children, as for a `list`"""
+        return len( self ) != 0
 
     def __contains__( self, key ):
         self.genDict()
@@ -201,8 +437,11 @@ class BlobGroup( Blob, UserList ):
             return super().__getitem__( i )
 
     def __str__( self ):
-        return '[' + ', '.join(
-                [f"{b.sig}: {repr( b )}" for b in self] ) + ']'
+        """Return the children as a string. Only the first 32 are shown."""
+
+        more = ', ...' if len( self ) > 32 else ''
+        return '[' + ', '.join( f"{b.sig}: {repr( b )}"
+                               for b in islice( self, 32 )) + more + ']'
     
     def keys( self ):
         self.genDict()
@@ -213,16 +452,50 @@ class BlobGroup( Blob, UserList ):
         return self.dict.items()
     
     def values( self ):
-        return self.data
+        return self
+
+    @property
+    def data( self ):
+        return self
+
+    @data.setter
+    def data( self, children ):
+        self[:] = children
+
+    def encodedSize( self ):
+        """Return the size of the group as encoded, including its children"""
+        return _GRPHDR.size + sum( b.encodedSize() for b in self )
 
     def encode( self ):
-        """Encode the group and its children appropriately for writing"""
+        """Encode the group and its children appropriately for writing.
+
+        Returns `bytes` with a standard group header followed by the encoding
+        of each child. Nested groups and large payloads are joined straight
+        into the result, without intermediate copies. To encode into an
+        existing buffer instead, use encodedSize() and encodeInto()."""
+
+        parts = []
+        self._encodeParts( parts )
+        return b''.join( parts )
+
+    def _encodeParts( self, parts ):
+        """Append the encoded group to the list `parts`, for joining"""
+
+        parts.append(
+                _GRPHDR.pack( _sigBytes( self._sig ), 4, len( self )))
+        for b in self:
+            b._encodeParts( parts )
+
+    def _packInto( self, buf, off ):
+        """Write the group header into `buf` at `off`, then each child"""
+
+        _GRPHDR.pack_into( buf, off, _sigBytes( self._sig ), 4, len( self ))
+        off += _GRPHDR.size
+        for b in self:
+            off = b._packInto( buf, off )
+        return off
 
-        output = bytearray()
-        output.extend( Blob( self.sig, len( self.data )).encode() )
-        for b in self.data:
-            output.extend( b.encode() )
-        return output
+Blob.register( BlobGroup )
 
 class BlobFile:
     """A file of Blob objects.
@@ -246,7 +519,8 @@ class BlobFile:
     type:
 
     None: Zero-byte "marker".
-    int: Two's complement, big-endian integer.
+    int: Two's complement, big-endian integer. This is decoded as signed; see
+    Blob.getAs() for reading files that store unsigned integers.
     bool: Boolean.
     str: String.
     bytes: Raw binary data.
@@ -281,13 +555,20 @@ class BlobFile:
     If a filetype is specified, the BlobFile will contain the fields `header`
     and `blobheader`, which will contain the blobs making up the header; they
     will not be returned with a read().
+
+    A readable BlobFile may instead be memory-mapped, by passing `mapped` or
+    opening it with openMmap(). Payloads are then `memoryview`s into the
+    mapping rather than copies of the data, which keep the mapping alive for
+    as long as they are referenced.
     """
     def __init__( self, fd, spec=None,
-                 filetype=None, version=None, blobver=None ):
+                 filetype=None, version=None, blobver=None, mapped=False ):
         """Create a BlobFile reader or writer.
 
         fd: File descriptor of open file
         spec: The specification of the file (see class documentation)
+        mapped: Read the file through a memory map, starting at the current
+        position of `fd`
         """
 
         self.fd = fd
@@ -295,6 +576,21 @@ class BlobFile:
             self.spec = spec
         else:
             self.spec = {}
+        # Reused by read() for each blob header
+        self._hdrbuf = bytearray( _HDR.size )
+
+        self._mmap = None
+        if mapped and fd.readable():
+            if os.fstat( fd.fileno() ).st_size:
+                self._mmap = mmap.mmap(
+                        fd.fileno(), 0, access=mmap.ACCESS_READ )
+                self._view = memoryview( self._mmap )
+            else:
+                # Empty files can't be mapped
+                self._view = memoryview( b'' )
+            self._pos = fd.tell()
+        else:
+            self._view = None
 
         if fd.readable() and filetype:
             blobheader = self.read()
@@ -327,6 +623,7 @@ class BlobFile:
         return self
 
     def __exit__( self, type, value, traceback ):
+        self._unmap()
         self.fd.__exit__( type, value, traceback )
 
     @classmethod
@@ -346,15 +643,51 @@ class BlobFile:
         fd.__enter__()
         return cls( fd, spec, filetype, version, blobver )
 
+    @classmethod
+    def openMmap( cls, path, spec=None,
+                 filetype=None, version=None, blobver=None ):
+        """Open the given file for reading through a memory map, and return a
+        BlobFile object.
+
+        Arguments are as for open(). Payloads of the blobs read are
+        `memoryview`s into the file, rather than copies.
+        """
+        fd = open( path, 'rb' )
+        fd.__enter__()
+        return cls( fd, spec, filetype, version, blobver, mapped=True )
+
     def close( self ):
         """Close the file"""
+        self._unmap()
         self.fd.close()
 
+    def _unmap( self ):
+        """Release the memory map, if there is one"""
+
+        if self._mmap is not None:
+            self._view.release()
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Blobs still refer to it; it's unmapped once they're gone
+                pass
+            self._mmap = None
+
     def write( self, blob ):
         """Write a Blob to the stream."""
 
         self.fd.write( blob.encode() )
 
+    def writeAll( self, blobs ):
+        """Write several Blobs to the stream.
+
+        Their encodings are joined and written with a single call."""
+
+        parts = []
+        for b in blobs:
+            b._encodeParts( parts )
+        self.fd.write( b''.join( parts ))
+
     def next( self ):
         """(Depricated) Synonym for read()"""
 
@@ -366,46 +699,105 @@ class BlobFile:
         Note that checking for "truthiness" of the returned object is
         technically not adequate to detect EOF, as an empty BlobGroup is
         considered "false", as it's an empty list
+
+        Raises EOFError if the file ends partway through a blob header or a
+        group.
         """
         fh = self.fd
-        sigraw = fh.read( 4 )
-        if not sigraw:
-            return None # EOF
-        sig = sigraw.decode()
-        size = int.from_bytes( fh.read( 4 ), byteorder='big' ) 
-        if size:
-            data = fh.read( size )
-        else:
-            data = None
-
-        blob = Blob( sig, data )
-        btype = self.spec.get( sig )
-        if btype is list:
-            # Blob is a group, length specified by opening blob
-            grp = BlobGroup( blob.sig )
-            for i in range( int( blob )):
-                grp.append( self.read() )
-            return grp
-        elif isinstance( btype, int ):
-            # Blob is a group of a fixed length
-            grp = BlobGroup( blob.sig, content=blob.content )
-            for i in range( btype ):
-                grp.append( self.read() )
-            return grp
-        elif isinstance( btype, str ):
-            # Blob is a group with an end marker
-            grp = BlobGroup( blob.sig, content=blob.content )
-            blob = self.read()
-            while blob.sig != btype:
-                grp.append( blob )
-                blob = self.read()
-            grp.terminator = blob
-            return grp
-        else:
-            # Blob is a single entity
-            if size != 0 and btype != None:
-                blob.convert( btype )
-        return blob
+        hdrbuf = self._hdrbuf
+        hdrsize = _HDR.size
+        unpack = _HDR.unpack
+        intern = sys.intern
+        view = self._view
+        spec = self.spec
+        specGet = spec.get
+
+        # Groups still being read, innermost last. Each entry is a
+        # [group, index] pair, where index is the next slot to fill in the
+        # (preallocated) group, or None if the group runs until an end
+        # marker.
+        stack = []
+        while True:
+            if view is None:
+                n = fh.readinto( hdrbuf )
+                if n < hdrsize:
+                    if n:
+                        raise EOFError( 'End of file inside a blob header' )
+                    sigraw = None
+                else:
+                    sigraw, size = unpack( hdrbuf )
+                    data = fh.read( size ) if size else None
+            else:
+                # Memory mapped; the payload is a view into the mapping
+                pos = self._pos
+                if pos + hdrsize > len( view ):
+                    if pos < len( view ):
+                        raise EOFError( 'End of file inside a blob header' )
+                    sigraw = None
+                else:
+                    sigraw, size = _HDR.unpack_from( view, pos )
+                    pos += hdrsize
+                    data = view[pos:pos + size] if size else None
+                    self._pos = pos + size
+
+            if sigraw is None:
+                if stack:
+                    raise EOFError( 'End of file inside a group' )
+                return None # EOF
+            # The same few signatures are generally repeated throughout a file
+            sig = intern( sigraw.decode( 'ASCII' ))
+
+            btype = specGet( sig )
+            isGroup = btype is list or isinstance( btype, (int, str) )
+            if isGroup:
+                blob = Blob( sig, data )
+            else:
+                # Single entity, converted to its type when first used
+                blob = Blob( sig, data, dtype=btype if size else None )
+
+            if (stack and stack[-1][1] is None
+                and sig == spec[stack[-1][0]._sig]):
+                # End marker of the current group
+                grp = stack.pop()[0]
+                grp.terminator = blob
+                blob = grp
+            elif isGroup:
+                if btype is list:
+                    # Blob is a group, length specified by opening blob
+                    grp = BlobGroup( sig )
+                    grp.extend( [None] * int( blob ))
+                elif isinstance( btype, str ):
+                    # Blob is a group with an end marker
+                    grp = BlobGroup( sig, content=blob.content )
+                    stack.append( [grp, None] )
+                    continue
+                else:
+                    # Blob is a group of a fixed length
+                    grp = BlobGroup( sig, content=blob.content )
+                    grp.extend( [None] * btype )
+
+                if len( grp ):
+                    stack.append( [grp, 0] )
+                    continue
+                blob = grp
+
+            # Store the completed blob in its group, closing off any groups it
+            # fills up
+            while stack:
+                frame = stack[-1]
+                grp, i = frame
+                grp.dict.setdefault( blob._sig, blob )
+                if i is None:
+                    grp.append( blob )
+                    break
+                grp[i] = blob
+                frame[1] = i + 1
+                if frame[1] < len( grp ):
+                    break
+                stack.pop()
+                blob = grp
+            else:
+                return blob
 
     def __iter__( self ):
         return self